@@ -1,16 +1,35 @@
 #!/usr/bin/env python3
 
 import os
+import io
+import hashlib
 import random
+import numpy as np
 from PIL import Image
 from pathlib import Path
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 GRID_ROWS = 6
 GRID_COLS = 24
 OUTER_PADDING = 30
 INNER_PADDING = 12
+CACHE_DIR = Path.home() / '.cache' / 'chonkywalls'
+RESOLUTION_CACHE = CACHE_DIR / 'resolution'
+RESOLUTION_CACHE_TTL = 60
+MAX_SCREEN_DIMENSION = 16384
 CHUNKS = [
     (6, 3),  
     (4, 3),  
@@ -23,7 +42,19 @@ CHUNKS = [
 ]
 
 
+SourceImage = namedtuple('SourceImage', ['path', 'width', 'height'])
+
+
 def get_screen_resolution():
+    try:
+        if time.time() - os.stat(RESOLUTION_CACHE).st_mtime < RESOLUTION_CACHE_TTL:
+            with open(RESOLUTION_CACHE) as f:
+                width, height = map(int, f.read().split())
+            if 0 < width <= MAX_SCREEN_DIMENSION and 0 < height <= MAX_SCREEN_DIMENSION:
+                return width, height
+    except Exception:
+        pass
+
     try:
         result = subprocess.run(['hyprctl', 'monitors'], capture_output=True, text=True, timeout=5)
         if result.returncode == 0:
@@ -35,23 +66,93 @@ def get_screen_resolution():
                             resolution_part = part.split('@')[0].strip()
                             if 'x' in resolution_part:
                                 width, height = map(int, resolution_part.split('x'))
+                                try:
+                                    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                                    with open(RESOLUTION_CACHE, 'w') as f:
+                                        f.write(f"{width} {height}")
+                                except OSError:
+                                    pass
                                 return width, height
     except Exception:
         pass
     return 5120, 1440
 
 
+def content_hash(data):
+    if xxhash is not None:
+        return xxhash.xxh128(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def resize_image(img, new_width, new_height):
+    """Pillow LANCZOS resize; with cv2, box-reduce then INTER_AREA (INTER_LANCZOS4 when enlarging)"""
+    if cv2 is None:
+        return img.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    if img.width / new_width > 4 or img.height / new_height > 4:
+        factor = min(img.width // (new_width * 2), img.height // (new_height * 2))
+        if factor > 1:
+            img = img.reduce(factor)
+    # Lanczos4 is a fixed 8x8 kernel with no prefilter and aliases when shrinking; INTER_AREA doesn't
+    shrinking = new_width < img.width or new_height < img.height
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+    resized = cv2.resize(np.asarray(img), (new_width, new_height), interpolation=interpolation)
+    return Image.fromarray(resized)
+
+
+def load_tile(source, new_width, new_height):
+    """Decode and resize a source image, reusing a tile cached from a previous run if present"""
+    try:
+        with open(source.path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    backend = "pil" if cv2 is None else "cv2"
+    cache_path = CACHE_DIR / f"{content_hash(data)}_{new_width}x{new_height}_{backend}.png"
+    if cache_path.exists():
+        try:
+            cached = Image.open(cache_path)
+            cached.load()
+            return cached if cached.mode == 'RGB' else cached.convert('RGB')
+        except Exception:
+            pass
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('RGB', (new_width, new_height))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            resized = resize_image(img, new_width, new_height)
+    except Exception:
+        return None
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        resized.save(cache_path, compress_level=1)
+    except Exception:
+        pass
+    return resized
+
+
 def load_images(image_folder):
+    """List source images with their dimensions; pixels are decoded later by load_tile"""
     supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp')
-    images = []
-    for file_path in Path(image_folder).glob('*'):
-        if file_path.suffix.lower() in supported_formats:
-            try:
-                img = Image.open(file_path)
-                images.append(img.convert('RGB'))
-            except Exception:
-                pass
-    return images
+    try:
+        with os.scandir(image_folder) as entries:
+            paths = [e.path for e in entries
+                     if e.is_file() and e.name.lower().endswith(supported_formats)]
+    except OSError:
+        return []
+
+    def load_one(file_path):
+        try:
+            with Image.open(file_path) as img:
+                return SourceImage(file_path, img.width, img.height)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        return [img for img in executor.map(load_one, paths) if img is not None]
 
 
 def create_chunk_grid_layout(images, screen_width, screen_height):
@@ -61,59 +162,85 @@ def create_chunk_grid_layout(images, screen_width, screen_height):
     cell_width = (screen_width - 2 * OUTER_PADDING - (GRID_COLS - 1) * INNER_PADDING) // GRID_COLS
     cell_height = (screen_height - 2 * OUTER_PADDING - (GRID_ROWS - 1) * INNER_PADDING) // GRID_ROWS
 
+    col_x = (OUTER_PADDING + np.arange(GRID_COLS) * (cell_width + INNER_PADDING)).tolist()
+    row_y = (OUTER_PADDING + np.arange(GRID_ROWS) * (cell_height + INNER_PADDING)).tolist()
+    chunk_pixel_w = (np.arange(GRID_COLS + 1) * (cell_width + INNER_PADDING) - INNER_PADDING).tolist()
+    chunk_pixel_h = (np.arange(GRID_ROWS + 1) * (cell_height + INNER_PADDING) - INNER_PADDING).tolist()
+
     canvas = Image.new('RGB', (screen_width, screen_height), (15, 15, 20))
-    grid = [[False for _ in range(GRID_COLS)] for _ in range(GRID_ROWS)]
+    grid = np.zeros((GRID_ROWS, GRID_COLS), dtype=np.uint8)
+    # Summed-area table as nested lists: scalar reads on a list are much cheaper than on an ndarray
+    sat = [[0] * (GRID_COLS + 1) for _ in range(GRID_ROWS + 1)]
     random.shuffle(images)
 
+    def region_sum(r0, c0, r1, c1):
+        """Count occupied cells in rows [r0, r1) and cols [c0, c1), clamped to the grid"""
+        r0, c0 = max(0, r0), max(0, c0)
+        r1, c1 = min(GRID_ROWS, r1), min(GRID_COLS, c1)
+        return sat[r1][c1] - sat[r0][c1] - sat[r1][c0] + sat[r0][c0]
+
     def fits(chunk_w, chunk_h, row, col):
         if row + chunk_h > GRID_ROWS or col + chunk_w > GRID_COLS:
             return False
-        for r in range(row, row + chunk_h):
-            for c in range(col, col + chunk_w):
-                if grid[r][c]:
-                    return False
-        return True
+        return region_sum(row, col, row + chunk_h, col + chunk_w) == 0
 
     def occupy(chunk_w, chunk_h, row, col):
-        for r in range(row, row + chunk_h):
-            for c in range(col, col + chunk_w):
-                grid[r][c] = True
-
-    image_idx = 0
-    for chunk_w, chunk_h in CHUNKS * 100:  
-        placed = False
-        for row in range(GRID_ROWS):
-            for col in range(GRID_COLS):
+        grid[row:row + chunk_h, col:col + chunk_w] = 1
+        sat[1:] = [[0] + sums for sums in grid.cumsum(0).cumsum(1).tolist()]
+
+    def plan_placements():
+        """Walk the grid once in row-major order, filling each empty cell with the next chunk that fits"""
+        placements = []
+        chunk_idx = 0
+        for cell in range(GRID_ROWS * GRID_COLS):
+            row, col = divmod(cell, GRID_COLS)
+            if region_sum(row, col, row + 1, col + 1):
+                continue
+            if len(placements) >= len(images):
+                break
+
+            for i in range(len(CHUNKS)):
+                chunk_w, chunk_h = CHUNKS[(chunk_idx + i) % len(CHUNKS)]
                 if fits(chunk_w, chunk_h, row, col):
-                    if image_idx >= len(images):
-                        return canvas
-                    img = images[image_idx]
-                    image_idx += 1
-
-                    x = OUTER_PADDING + col * (cell_width + INNER_PADDING)
-                    y = OUTER_PADDING + row * (cell_height + INNER_PADDING)
-                    w = chunk_w * cell_width + (chunk_w - 1) * INNER_PADDING
-                    h = chunk_h * cell_height + (chunk_h - 1) * INNER_PADDING
-
-                    aspect_img = img.width / img.height
-                    aspect_chunk = w / h
-
-                    if aspect_img > aspect_chunk:
-                        new_height = h
-                        new_width = int(h * aspect_img)
-                    else:
-                        new_width = w
-                        new_height = int(w / aspect_img)
-
-                    resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                    offset_x = x + (w - new_width) // 2
-                    offset_y = y + (h - new_height) // 2
-                    canvas.paste(resized, (offset_x, offset_y))
-                    occupy(chunk_w, chunk_h, row, col)
-                    placed = True
+                    chunk_idx = (chunk_idx + i + 1) % len(CHUNKS)
                     break
-            if placed:
-                break
+            else:
+                continue
+            img = images[len(placements)]
+
+            placements.append((img, col_x[col], row_y[row], chunk_pixel_w[chunk_w], chunk_pixel_h[chunk_h]))
+            occupy(chunk_w, chunk_h, row, col)
+        return placements
+
+    def resize_one(placement):
+        img, x, y, w, h = placement
+        aspect_img = img.width / img.height
+        aspect_chunk = w / h
+
+        if aspect_img > aspect_chunk:
+            new_height = h
+            new_width = int(h * aspect_img)
+        else:
+            new_width = w
+            new_height = int(w / aspect_img)
+
+        offset_x = x + (w - new_width) // 2
+        offset_y = y + (h - new_height) // 2
+        return load_tile(img, new_width, new_height), offset_x, offset_y
+
+    placements = plan_placements()
+    spares = iter(images[len(placements):])
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        for placement, (resized, offset_x, offset_y) in zip(placements, executor.map(resize_one, placements)):
+            # A file can pass the header check and still fail to decode; hand its cell to an unused image
+            while resized is None:
+                spare = next(spares, None)
+                if spare is None:
+                    break
+                resized, offset_x, offset_y = resize_one((spare,) + placement[1:])
+            if resized is not None:
+                canvas.paste(resized, (offset_x, offset_y))
+                resized.close()
     return canvas
 
 
@@ -130,9 +257,20 @@ def main():
 
     if wallpaper:
         try:
-            wallpaper.save(output_filename, quality=95)
+            if output_filename.lower().endswith('.png'):
+                wallpaper.save(output_filename, compress_level=1)
+            else:
+                wallpaper.save(output_filename, quality=95)
             print(f"\u2713 Wallpaper saved as: {output_filename}")
-            subprocess.run(["swww", "img", output_filename], check=True)
+            proc = subprocess.Popen(["swww", "img", output_filename])
+            try:
+                with open(output_filename, 'rb') as saved:
+                    os.fsync(saved.fileno())
+                wallpaper.close()
+            finally:
+                returncode = proc.wait()
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, proc.args)
             print(f"\u2713 Wallpaper applied via: swww img {output_filename}")
         except Exception as e:
             print(f"\u26a0\ufe0f Error saving or setting wallpaper: {e}")
@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 
 import os
+import io
+import hashlib
+import heapq
 import random
+import numpy as np
 from PIL import Image
 from pathlib import Path
 import subprocess
 import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
 
 GRID_ROWS = 8
 GRID_COLS = 28
 OUTER_PADDING = 20
 INNER_PADDING = 6
+CACHE_DIR = Path.home() / '.cache' / 'chonkywalls'
+RESOLUTION_CACHE = CACHE_DIR / 'resolution'
+RESOLUTION_CACHE_TTL = 60
+MAX_SCREEN_DIMENSION = 16384
 
 CHUNKS = [
     (4, 2),  
@@ -42,7 +62,18 @@ CHUNK_WEIGHTS = [
     1,   
 ]
 
+SourceImage = namedtuple('SourceImage', ['path', 'width', 'height'])
+
 def get_screen_resolution():
+    try:
+        if time.time() - os.stat(RESOLUTION_CACHE).st_mtime < RESOLUTION_CACHE_TTL:
+            with open(RESOLUTION_CACHE) as f:
+                width, height = map(int, f.read().split())
+            if 0 < width <= MAX_SCREEN_DIMENSION and 0 < height <= MAX_SCREEN_DIMENSION:
+                return width, height
+    except Exception:
+        pass
+
     try:
         result = subprocess.run(['hyprctl', 'monitors'], capture_output=True, text=True, timeout=5)
         if result.returncode == 0:
@@ -54,22 +85,107 @@ def get_screen_resolution():
                             resolution_part = part.split('@')[0].strip()
                             if 'x' in resolution_part:
                                 width, height = map(int, resolution_part.split('x'))
+                                try:
+                                    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                                    with open(RESOLUTION_CACHE, 'w') as f:
+                                        f.write(f"{width} {height}")
+                                except OSError:
+                                    pass
                                 return width, height
     except Exception:
         pass
     return 5120, 1440
 
+def content_hash(data):
+    if xxhash is not None:
+        return xxhash.xxh128(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def cover_box(width, height, new_width, new_height):
+    """Centered source region with the target's aspect ratio, so resizing it fills the target exactly"""
+    if width * new_height > height * new_width:
+        crop_w = height * new_width // new_height
+        left = (width - crop_w) // 2
+        return (left, 0, left + crop_w, height)
+    crop_h = width * new_height // new_width
+    top = (height - crop_h) // 2
+    return (0, top, width, top + crop_h)
+
+def resize_image(img, new_width, new_height, box=None):
+    """Resize the source region box to an HxWx3 uint8 array: Pillow LANCZOS, or with cv2,
+    box-reduce then INTER_AREA (INTER_LANCZOS4 when enlarging)"""
+    if cv2 is None:
+        return np.asarray(img.resize((new_width, new_height), Image.Resampling.LANCZOS, box, reducing_gap=2.0))
+    if box is None:
+        box = (0, 0, img.width, img.height)
+    box_w, box_h = box[2] - box[0], box[3] - box[1]
+    if box_w / new_width > 4 or box_h / new_height > 4:
+        factor = min(box_w // (new_width * 2), box_h // (new_height * 2))
+        if factor > 1:
+            img = img.reduce(factor, box)
+            box = (0, 0, img.width, img.height)
+    if box != (0, 0, img.width, img.height):
+        img = img.crop(box)
+    # Lanczos4 is a fixed 8x8 kernel with no prefilter and aliases when shrinking; INTER_AREA doesn't
+    shrinking = new_width < img.width or new_height < img.height
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LANCZOS4
+    return cv2.resize(np.asarray(img), (new_width, new_height), interpolation=interpolation)
+
+def load_tile(source, new_width, new_height, fill=False):
+    """Decode and resize a source image to an HxWx3 array, reusing a tile cached from a previous run if present.
+    With fill, the source is center-cropped to the target aspect ratio instead of stretched."""
+    try:
+        with open(source.path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    backend = "pil" if cv2 is None else "cv2"
+    suffix = "_fill" if fill else ""
+    cache_path = CACHE_DIR / f"{content_hash(data)}_{new_width}x{new_height}_{backend}{suffix}.png"
+    if cache_path.exists():
+        try:
+            with Image.open(cache_path) as cached:
+                return np.asarray(cached if cached.mode == 'RGB' else cached.convert('RGB'))
+        except Exception:
+            pass
+
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('RGB', (new_width, new_height))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            box = cover_box(img.width, img.height, new_width, new_height) if fill else None
+            resized = resize_image(img, new_width, new_height, box)
+    except Exception:
+        return None
+
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        Image.fromarray(resized).save(cache_path, compress_level=1)
+    except Exception:
+        pass
+    return resized
+
 def load_images(image_folder):
+    """List source images with their dimensions; pixels are decoded later by load_tile"""
     supported_formats = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.webp')
-    images = []
-    for file_path in Path(image_folder).glob('*'):
-        if file_path.suffix.lower() in supported_formats:
-            try:
-                img = Image.open(file_path)
-                images.append(img.convert('RGB'))
-            except Exception:
-                pass
-    return images
+    try:
+        with os.scandir(image_folder) as entries:
+            paths = [e.path for e in entries
+                     if e.is_file() and e.name.lower().endswith(supported_formats)]
+    except OSError:
+        return []
+
+    def load_one(file_path):
+        try:
+            with Image.open(file_path) as img:
+                return SourceImage(file_path, img.width, img.height)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+        return [img for img in executor.map(load_one, paths) if img is not None]
 
 def create_freeflow_layout(images, screen_width, screen_height):
     if not images:
@@ -80,56 +196,74 @@ def create_freeflow_layout(images, screen_width, screen_height):
     cell_width = (screen_width - 2 * OUTER_PADDING - (GRID_COLS - 1) * INNER_PADDING) // GRID_COLS
     cell_height = (screen_height - 2 * OUTER_PADDING - (GRID_ROWS - 1) * INNER_PADDING) // GRID_ROWS
 
+    col_x = (OUTER_PADDING + np.arange(GRID_COLS) * (cell_width + INNER_PADDING)).tolist()
+    row_y = (OUTER_PADDING + np.arange(GRID_ROWS) * (cell_height + INNER_PADDING)).tolist()
+    chunk_pixel_w = (np.arange(GRID_COLS + 1) * (cell_width + INNER_PADDING) - INNER_PADDING).tolist()
+    chunk_pixel_h = (np.arange(GRID_ROWS + 1) * (cell_height + INNER_PADDING) - INNER_PADDING).tolist()
+
     print(f"Cell size: {cell_width}x{cell_height}")
     print(f"Padding: {OUTER_PADDING}px outer, {INNER_PADDING}px inner")
 
-    canvas = Image.new('RGB', (screen_width, screen_height), (15, 15, 20))
-    grid = [[False for _ in range(GRID_COLS)] for _ in range(GRID_ROWS)]
+    canvas = np.full((screen_height, screen_width, 3), (15, 15, 20), dtype=np.uint8)
+    grid = np.zeros((GRID_ROWS, GRID_COLS), dtype=np.uint8)
+    # Summed-area table as nested lists: scalar reads on a list are much cheaper than on an ndarray
+    sat = [[0] * (GRID_COLS + 1) for _ in range(GRID_ROWS + 1)]
     
     shuffled_images = images.copy()
     random.shuffle(shuffled_images)
 
+    def region_sum(r0, c0, r1, c1):
+        """Count occupied cells in rows [r0, r1) and cols [c0, c1), clamped to the grid"""
+        r0, c0 = max(0, r0), max(0, c0)
+        r1, c1 = min(GRID_ROWS, r1), min(GRID_COLS, c1)
+        return sat[r1][c1] - sat[r0][c1] - sat[r1][c0] + sat[r0][c0]
+
     def fits(chunk_w, chunk_h, row, col):
         if row + chunk_h > GRID_ROWS or col + chunk_w > GRID_COLS:
             return False
-        for r in range(row, row + chunk_h):
-            for c in range(col, col + chunk_w):
-                if grid[r][c]:
-                    return False
-        return True
+        return region_sum(row, col, row + chunk_h, col + chunk_w) == 0
+
+    # Scored fitting positions per chunk size, {(chunk_w, chunk_h): {(row, col): score}}
+    candidates = {}
+
+    def rescore(chunk_w, chunk_h, scores, r0, c0, r1, c1):
+        """Recompute candidate positions with top-left corner in rows [r0, r1) and cols [c0, c1)"""
+        for row in range(max(0, r0), min(GRID_ROWS, r1)):
+            for col in range(max(0, c0), min(GRID_COLS, c1)):
+                if fits(chunk_w, chunk_h, row, col):
+                    neighbors = region_sum(row - 1, col - 1, row + chunk_h + 1, col + chunk_w + 1)
+                    scores[(row, col)] = neighbors - (row * 0.1) - (col * 0.05)
+                else:
+                    scores.pop((row, col), None)
 
     def occupy(chunk_w, chunk_h, row, col):
-        for r in range(row, row + chunk_h):
-            for c in range(col, col + chunk_w):
-                grid[r][c] = True
+        grid[row:row + chunk_h, col:col + chunk_w] = 1
+        sat[1:] = [[0] + sums for sums in grid.cumsum(0).cumsum(1).tolist()]
+        # Only positions whose neighbor window overlaps the new chunk change score or stop fitting
+        for (cw, ch), scores in candidates.items():
+            rescore(cw, ch, scores, row - ch, col - cw, row + chunk_h + 1, col + chunk_w + 1)
 
     def find_best_position(chunk_w, chunk_h):
         """Find the best position for a chunk, trying multiple strategies"""
-        positions = []
+        scores = candidates.get((chunk_w, chunk_h))
+        if scores is None:
+            scores = candidates[(chunk_w, chunk_h)] = {}
+            rescore(chunk_w, chunk_h, scores, 0, 0, GRID_ROWS, GRID_COLS)
         
-        for row in range(GRID_ROWS):
-            for col in range(GRID_COLS):
-                if fits(chunk_w, chunk_h, row, col):
-                    score = 0
-                    neighbors = 0
-                    for r in range(max(0, row-1), min(GRID_ROWS, row + chunk_h + 1)):
-                        for c in range(max(0, col-1), min(GRID_COLS, col + chunk_w + 1)):
-                            if grid[r][c]:
-                                neighbors += 1
-                    
-                    score = neighbors - (row * 0.1) - (col * 0.05)  
-                    positions.append((score, row, col))
-        
-        if positions:
-            positions.sort(reverse=True)
-            top_positions = positions[:min(5, len(positions))]
-            return random.choice(top_positions)[1:] if top_positions else None
+        if scores:
+            top_positions = heapq.nlargest(5, ((score, row, col) for (row, col), score in scores.items()))
+            return random.choice(top_positions)[1:]
         return None
 
     def get_random_chunk():
         """Get a random chunk size based on weights"""
         return random.choices(CHUNKS, weights=CHUNK_WEIGHTS, k=1)[0]
 
+    def resize_one(placement):
+        img, w, h, x, y, cells = placement
+        return load_tile(img, w, h, fill=True), x, y
+
+    placements = []
     image_idx = 0
     placement_attempts = 0
     max_attempts = len(shuffled_images) * 3
@@ -156,47 +290,39 @@ def create_freeflow_layout(images, screen_width, screen_height):
         img = shuffled_images[image_idx]
         image_idx += 1
 
-        x = OUTER_PADDING + col * (cell_width + INNER_PADDING)
-        y = OUTER_PADDING + row * (cell_height + INNER_PADDING)
-        w = chunk_w * cell_width + (chunk_w - 1) * INNER_PADDING
-        h = chunk_h * cell_height + (chunk_h - 1) * INNER_PADDING
-
-        aspect_img = img.width / img.height
-        aspect_chunk = w / h
-
-        if aspect_img > aspect_chunk:
-            new_height = h
-            new_width = int(h * aspect_img)
-            offset_x = x - (new_width - w) // 2 
-            offset_y = y
-        else:
-            new_width = w
-            new_height = int(w / aspect_img)
-            offset_x = x
-            offset_y = y - (new_height - h) // 2 
-
-        resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        
-        if new_width > w or new_height > h:
-            crop_x = max(0, (new_width - w) // 2)
-            crop_y = max(0, (new_height - h) // 2)
-            resized = resized.crop((crop_x, crop_y, crop_x + w, crop_y + h))
-            offset_x = x
-            offset_y = y
-
-        canvas.paste(resized, (offset_x, offset_y))
+        x = col_x[col]
+        y = row_y[row]
+        w = chunk_pixel_w[chunk_w]
+        h = chunk_pixel_h[chunk_h]
+
+        placements.append((img, w, h, x, y, chunk_w * chunk_h))
         occupy(chunk_w, chunk_h, row, col)
         
         if image_idx % 20 == 0:
-            filled_cells = sum(sum(row) for row in grid)
+            filled_cells = int(grid.sum())
             total_cells = GRID_ROWS * GRID_COLS
-            print(f"Placed {image_idx} images, grid {filled_cells}/{total_cells} filled ({filled_cells/total_cells*100:.1f}%)")
+            print(f"Planned {image_idx} tiles, grid {filled_cells}/{total_cells} reserved ({filled_cells/total_cells*100:.1f}%)")
+
+    placed = 0
+    filled_cells = 0
+    spares = iter(shuffled_images[image_idx:])
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        for placement, (tile, x, y) in zip(placements, executor.map(resize_one, placements)):
+            # A file can pass the header check and still fail to decode; hand its cell to an unused image
+            while tile is None:
+                spare = next(spares, None)
+                if spare is None:
+                    break
+                tile, x, y = resize_one((spare,) + placement[1:])
+            if tile is not None:
+                canvas[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+                placed += 1
+                filled_cells += placement[5]
 
-    filled_cells = sum(sum(row) for row in grid)
     total_cells = GRID_ROWS * GRID_COLS
-    print(f"Layout complete: {image_idx} images placed, {filled_cells}/{total_cells} cells filled ({filled_cells/total_cells*100:.1f}%)")
+    print(f"Layout complete: {placed} images placed, {filled_cells}/{total_cells} cells filled ({filled_cells/total_cells*100:.1f}%)")
     
-    return canvas
+    return Image.fromarray(canvas)
 
 def main():
     image_folder = "/home/saehwa/Pictures/"
@@ -207,14 +333,25 @@ def main():
         print("No images found.")
         return
 
-    print(f"Loaded {len(images)} images")
+    print(f"Found {len(images)} images")
     wallpaper = create_freeflow_layout(images, screen_width, screen_height)
 
     if wallpaper:
         try:
-            wallpaper.save(output_filename, quality=95)
+            if output_filename.lower().endswith('.png'):
+                wallpaper.save(output_filename, compress_level=1)
+            else:
+                wallpaper.save(output_filename, quality=95)
             print(f"✓ Wallpaper saved as: {output_filename}")
-            subprocess.run(["swww", "img", output_filename], check=True)
+            proc = subprocess.Popen(["swww", "img", output_filename])
+            try:
+                with open(output_filename, 'rb') as saved:
+                    os.fsync(saved.fileno())
+                wallpaper.close()
+            finally:
+                returncode = proc.wait()
+            if returncode != 0:
+                raise subprocess.CalledProcessError(returncode, proc.args)
             print(f"✓ Wallpaper applied via: swww img {output_filename}")
         except Exception as e:
             print(f"⚠️ Error saving or setting wallpaper: {e}")